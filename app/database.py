@@ -2,6 +2,7 @@
 
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.dialects.sqlite import insert
 
 # Define the database URL, using SQLite for simplicity
 DATABASE_URL = "sqlite+aiosqlite:///./flights.db"  
@@ -15,3 +16,27 @@ async_session = sessionmaker(
     class_=AsyncSession, 
     expire_on_commit=False  
 )
+
+# Rows per bulk INSERT/DELETE statement; keeps bound parameters well under SQLite's limit
+BULK_BATCH_SIZE = 500
+
+
+# Build an INSERT ... ON CONFLICT DO NOTHING that RETURNs the key columns of the rows it inserted,
+# so callers can tell new rows from existing ones without a separate lookup
+def insert_or_skip(table, key_columns):
+    return (
+        insert(table)
+        .on_conflict_do_nothing(index_elements=key_columns)
+        .returning(*(table.c[column] for column in key_columns))
+    )
+
+
+# Execute a statement for the given parameter rows in BULK_BATCH_SIZE batches on a Core connection.
+# SQLAlchemy turns each batch into multi-row statements while reusing one cached compiled statement.
+# Returns the RETURNING rows of all batches as tuples.
+async def execute_in_batches(connection, statement, rows: list) -> list:
+    returned = []
+    for start in range(0, len(rows), BULK_BATCH_SIZE):
+        result = await connection.execute(statement, rows[start:start + BULK_BATCH_SIZE])
+        returned.extend(tuple(row) for row in result.all())
+    return returned
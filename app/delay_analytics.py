@@ -0,0 +1,169 @@
+# app/delay_analytics.py
+
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import delete
+from sqlalchemy.future import select
+from app.database import execute_in_batches, insert_or_skip
+from app.models import CountedDelay, DelaySketch
+from app.utils.sketch import DDSketch
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DELAY_METRICS = ("departure_delay", "arrival_delay")
+PERCENTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+
+# Longest window the analytics endpoint serves; older delay sketch buckets are pruned
+MAX_WINDOW_HOURS = 24 * 30
+
+# How long counted flights are remembered, so the same flight seen again on the
+# next periodic fetch does not skew the percentiles
+DEDUP_RETENTION = timedelta(days=2)
+
+# Insert-or-skip on the unique (metric, icao, scheduled) constraint; RETURNING yields only
+# the observations that had not been counted before, even across workers and restarts
+_count_delays_stmt = insert_or_skip(CountedDelay.__table__, ["metric", "icao", "scheduled"])
+
+
+# Convert a timestamp to naive UTC, the form stored in the database
+def to_utc_naive(timestamp: datetime) -> datetime:
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+# Truncate a timestamp to the start of its hourly UTC bucket
+def bucket_start_for(timestamp: datetime) -> datetime:
+    return to_utc_naive(timestamp).replace(minute=0, second=0, microsecond=0)
+
+
+# Build the route key used for source -> destination sketches
+def route_key(source_code: str, destination_code: str) -> str:
+    return f"{source_code}-{destination_code}"
+
+
+# Collect the final delays of a flight into the batch, keyed by (metric, icao, scheduled time).
+# Only delays with a known actual time and a stable identity (icao) are collected;
+# flush_delay_sketches decides which of them have not been counted yet.
+def record_flight_delays(batch: dict, icao, source_code, destination_code,
+                         scheduled_departure, actual_departure, departure_delay,
+                         scheduled_arrival, actual_arrival, arrival_delay):
+    if not icao:
+        return
+
+    observations = (
+        ("departure_delay", scheduled_departure, actual_departure, departure_delay, source_code),
+        ("arrival_delay", scheduled_arrival, actual_arrival, arrival_delay, destination_code),
+    )
+
+    for metric, scheduled, actual, delay, airport_code in observations:
+        if not scheduled or not actual or delay is None:
+            continue
+
+        targets = []
+        if airport_code:
+            targets.append(("airport", airport_code))
+        if source_code and destination_code:
+            targets.append(("route", route_key(source_code, destination_code)))
+
+        batch[(metric, icao, to_utc_naive(scheduled))] = (targets, delay)
+
+
+# Record the batch's observations as counted and return the keys that were not counted before
+async def _count_new_delays(connection, batch: dict) -> set:
+    rows = [{"metric": metric, "icao": icao, "scheduled": scheduled} for metric, icao, scheduled in batch]
+    return set(await execute_in_batches(connection, _count_delays_stmt, rows))
+
+
+# Merge one batch sketch into its stored bucket sketch
+async def _merge_sketch(session, bucket: datetime, scope: str, key: str, metric: str, sketch: DDSketch):
+    result = await session.execute(
+        select(DelaySketch).where(
+            DelaySketch.bucket_start == bucket,
+            DelaySketch.scope == scope,
+            DelaySketch.key == key,
+            DelaySketch.metric == metric,
+        )
+    )
+    stored = result.scalar_one_or_none()
+
+    if stored:
+        merged = DDSketch.from_dict(json.loads(stored.sketch))
+        merged.merge(sketch)
+        stored.sketch = json.dumps(merged.to_dict())
+    else:
+        session.add(DelaySketch(
+            bucket_start=bucket,
+            scope=scope,
+            key=key,
+            metric=metric,
+            sketch=json.dumps(sketch.to_dict())
+        ))
+
+
+# Add the batch's not-yet-counted delays to the stored per-bucket sketches.
+# Runs in the ingest transaction (caller commits), so the counted keys and the sketch
+# updates are stored together; callers must serialize ingests (see process_flight_data)
+# because the sketch merge is a read-modify-write.
+async def flush_delay_sketches(session, batch: dict):
+    connection = await session.connection()
+    now = to_utc_naive(datetime.now(timezone.utc))
+
+    # Forget flights old enough that they won't be fetched again
+    cutoff = now - DEDUP_RETENTION
+    await connection.execute(delete(CountedDelay.__table__).where(CountedDelay.__table__.c.scheduled < cutoff))
+
+    # Drop sketch buckets no window can reach any more
+    sketch_cutoff = bucket_start_for(now) - timedelta(hours=MAX_WINDOW_HOURS)
+    await connection.execute(delete(DelaySketch.__table__).where(DelaySketch.__table__.c.bucket_start < sketch_cutoff))
+
+    if batch:
+        new_keys = await _count_new_delays(connection, batch)
+
+        sketches = {}
+        for metric, icao, scheduled in new_keys:
+            targets, delay = batch[(metric, icao, scheduled)]
+            bucket = bucket_start_for(scheduled)
+            if bucket < sketch_cutoff:
+                continue
+            for scope, key in targets:
+                sketch = sketches.get((bucket, scope, key, metric))
+                if sketch is None:
+                    sketch = sketches[(bucket, scope, key, metric)] = DDSketch()
+                sketch.add(delay)
+
+        for (bucket, scope, key, metric), sketch in sketches.items():
+            await _merge_sketch(session, bucket, scope, key, metric, sketch)
+
+        if sketches:
+            logger.info(f"Counted {len(new_keys)} new delays into {len(sketches)} delay sketches")
+
+
+# Summarize a sketch into the percentile view served by the API
+def summarize_sketch(sketch: DDSketch) -> dict:
+    summary = {"count": sketch.count, "min": sketch.min, "max": sketch.max}
+    for name, q in PERCENTILES.items():
+        value = sketch.quantile(q)
+        summary[name] = round(value, 2) if value is not None else None
+    return summary
+
+
+# Merge all stored sketches for a scope/key since start_time into one sketch per metric
+async def get_delay_percentiles(session, scope: str, key: str, start_time: datetime) -> dict:
+    result = await session.execute(
+        select(DelaySketch.metric, DelaySketch.sketch).where(
+            DelaySketch.scope == scope,
+            DelaySketch.key == key,
+            DelaySketch.bucket_start >= bucket_start_for(start_time),
+        )
+    )
+
+    merged = {metric: DDSketch() for metric in DELAY_METRICS}
+    for metric, serialized in result.all():
+        if metric in merged:
+            merged[metric].merge(DDSketch.from_dict(json.loads(serialized)))
+
+    return {metric: summarize_sketch(sketch) for metric, sketch in merged.items()}
@@ -4,11 +4,14 @@ import aiohttp
 import asyncio
 import os
 import logging
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.future import select
 from datetime import datetime
-from app.models import Flight, Subscription
+from app.models import Flight, IngestState, Subscription
 from app.database import async_session
 from app.utils.messaging import send_notifications
+from app.delay_analytics import record_flight_delays, flush_delay_sketches
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -18,6 +21,34 @@ logger = logging.getLogger(__name__)
 API_KEY = os.getenv("API_KEY")
 API_URL = f"http://api.aviationstack.com/v1/flights?access_key={API_KEY}"
 
+# Serializes ingests from periodic_fetch and /flights/update within this process. The
+# delay sketch merge is a read-modify-write; across processes it is protected by the
+# SQLite write lock that the ingest transaction already holds before it reads the sketches.
+_ingest_lock = asyncio.Lock()
+
+# Insert or bump the single ingest_state row; runs inside the ingest transaction so the
+# generation every worker sees changes exactly when the ingested data does
+_bump_generation_stmt = (
+    insert(IngestState.__table__)
+    .values(id=1, generation=1, last_ingest_at=func.current_timestamp())
+    .on_conflict_do_update(
+        index_elements=["id"],
+        set_={"generation": IngestState.__table__.c.generation + 1, "last_ingest_at": func.current_timestamp()},
+    )
+)
+
+
+# Get the current ingest generation from the database; used to derive ETags for data routes
+async def get_ingest_generation(session) -> str:
+    result = await session.execute(
+        select(IngestState.generation, IngestState.last_ingest_at).where(IngestState.id == 1)
+    )
+    state = result.one_or_none()
+    if state is None:
+        return "0"
+    # The commit time keeps ETags distinct if the database is recreated and the counter restarts
+    return f"{state.generation}.{state.last_ingest_at.isoformat() if state.last_ingest_at else ''}"
+
 # Fetch flight data from AviationStack API asynchronously
 async def fetch_flight_data():
     try:
@@ -37,6 +68,14 @@ async def process_flight_data():
         logger.warning("No flight data fetched")
         return
     
+    async with _ingest_lock:
+        await _store_flight_data(flight_data)
+
+# Store one fetch of flight data, its delay sketches and notifications in a single transaction
+async def _store_flight_data(flight_data):
+    # Final delays of this fetch, merged into the stored delay sketches before commit
+    delay_batch = {}
+
     async with async_session() as session:
         for flight in flight_data:
             if not flight:
@@ -124,6 +163,13 @@ async def process_flight_data():
             # Insert or update the flight in the database
             await session.merge(flight_instance)
 
+            # Feed the final delays into the streaming percentile sketches
+            record_flight_delays(
+                delay_batch, icao, source_code, destination_code,
+                flight_instance.scheduled_departure, flight_instance.actual_departure, departure_delay,
+                flight_instance.scheduled_arrival, flight_instance.actual_arrival, arrival_delay
+            )
+
             # Handle status notifications
             if status in ["landed", "cancelled", "delayed", "incident", "diverted"]:
                 query = select(Subscription).where(
@@ -136,6 +182,9 @@ async def process_flight_data():
                 for subscription in subscriptions:
                     await handle_notifications(subscription, status, arrival_delay, source_code, destination_code, icao, source_location, destination_location)
 
+        await flush_delay_sketches(session, delay_batch)
+        await session.execute(_bump_generation_stmt)
+
         # Commit the changes to the database
         await session.commit()
 
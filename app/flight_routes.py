@@ -5,15 +5,19 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import union
 from typing import List, Optional
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from app.models import *
 from app.schema import FlightBase
-from fastapi import Query
-import os
+from fastapi import Query, Request
 import logging
 from app.database import async_session
-from app.flight_data_service import process_flight_data
-from fastapi.responses import HTMLResponse, JSONResponse
+from app.flight_data_service import process_flight_data, get_ingest_generation
+from app.delay_analytics import MAX_WINDOW_HOURS, get_delay_percentiles, route_key, to_utc_naive
+from app.subscription_service import (
+    MAX_BULK_BODY_BYTES, MAX_BULK_ITEMS, bulk_subscribe, bulk_unsubscribe, parse_bulk_items, summarize_results
+)
+from fastapi.responses import HTMLResponse
+from app.utils.responses import asset_response, get_static_asset, json_response, make_etag, not_modified, not_modified_response
 
 # Set up logger
 logging.basicConfig(level=logging.INFO)
@@ -32,15 +36,24 @@ async def get_db():
         yield db
 
 
+# Serialize a Flight row the way its FlightBase response model would
+def flight_json(flight) -> dict:
+    return FlightBase.model_validate(flight).model_dump(mode="json")
+
+
 # Route to get a paginated list of flights
 @router.get("/", response_model=List[FlightBase])
-async def read_flights(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
+async def read_flights(request: Request, skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
     """
     Fetch paginated list of flights with optional skip and limit.
     """
+    etag = make_etag(await get_ingest_generation(db), "flights", skip, limit)
+    if not_modified(request, etag):
+        return not_modified_response(request, etag)
+
     result = await db.execute(select(Flight).offset(skip).limit(limit))
     flights = result.scalars().all()
-    return flights
+    return json_response(request, [flight_json(flight) for flight in flights], etag=etag)
 
 # Route to update flight data (calls the background data fetching service)
 @router.get("/update")
@@ -52,7 +65,7 @@ async def update_data(db: AsyncSession = Depends(get_db)):
     return {"message": "Flight data updated successfully."}
 
 @router.get("/summary", response_model=dict)
-async def get_airport_summary(airport_code: str = None, time_range: str = 'last_24_hours', db: AsyncSession = Depends(get_db)):
+async def get_airport_summary(request: Request, airport_code: str = None, time_range: str = 'last_24_hours', db: AsyncSession = Depends(get_db)):
 
     """
     Get summary of inbound/outbound flights for a given airport or globally for the last 24 hours or today.
@@ -62,6 +75,13 @@ async def get_airport_summary(airport_code: str = None, time_range: str = 'last_
         start_time = now - timedelta(hours=24)
     else:
         start_time = datetime.combine(now.date(), datetime.min.time())
+    start_time = start_time.replace(second=0, microsecond=0)
+
+    # Data only changes on ingest or when the window start moves to the next minute
+    etag = make_etag(await get_ingest_generation(db), "summary", airport_code, start_time.isoformat())
+    if not_modified(request, etag):
+        return not_modified_response(request, etag)
+
     if airport_code:
         result = await db.execute(
             select(Flight).where(
@@ -112,26 +132,63 @@ async def get_airport_summary(airport_code: str = None, time_range: str = 'last_
         "outbound_flights": outbound_summary,
     }
 
-    return summary
+    return json_response(request, summary, etag=etag)
+
+# Route to get delay percentiles per airport or route from the streaming sketches
+@router.get("/analytics/delays", response_model=dict)
+async def get_delay_analytics(request: Request, airport_code: Optional[str] = None, source_code: Optional[str] = None,
+                              destination_code: Optional[str] = None, window_hours: int = Query(24, ge=1, le=MAX_WINDOW_HOURS),
+                              db: AsyncSession = Depends(get_db)):
+    """
+    Get p50/p90/p99 departure and arrival delays (minutes) for an airport or a source->destination route
+    over the last `window_hours`, merged from the hourly delay sketches.
+    """
+    if source_code and destination_code:
+        scope, key = "route", route_key(source_code, destination_code)
+    elif airport_code:
+        scope, key = "airport", airport_code
+    else:
+        raise HTTPException(status_code=400, detail="You must provide either an airport_code or both source_code and destination_code.")
+
+    start_time = to_utc_naive(datetime.now(timezone.utc)) - timedelta(hours=window_hours)
+
+    # Sketches only change on ingest, and the window only moves per hourly bucket
+    etag = make_etag(await get_ingest_generation(db), scope, key, window_hours, start_time.strftime('%Y-%m-%d %H'))
+    if not_modified(request, etag):
+        return not_modified_response(request, etag)
+
+    percentiles = await get_delay_percentiles(db, scope, key, start_time)
+
+    return json_response(request, {
+        "scope": scope,
+        "key": key,
+        "window_hours": window_hours,
+        **percentiles,
+    }, etag=etag)
 
 # Route to provide real-time data for flight status dashboard
 # Endpoint 1: Serve the dashboard HTML page
 @router.get("/dashboard", response_class=HTMLResponse)
-async def get_dashboard_page():
+async def get_dashboard_page(request: Request):
     """
-    Serve the flight dashboard HTML page.
+    Serve the flight dashboard HTML page from the preloaded static assets.
     """
-    file_path = os.path.join("static", "index.html")
-    with open(file_path, 'r') as html_file:
-        return html_file.read()
+    asset = get_static_asset("index.html")
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Dashboard not found")
+    return asset_response(request, asset)
 
 
 # Route to fetch available airports
 @router.get("/airports")
-async def get_airports(db: AsyncSession = Depends(get_db)):
+async def get_airports(request: Request, db: AsyncSession = Depends(get_db)):
     """
     Fetch unique airport codes from source and destination airports.
     """
+    etag = make_etag(await get_ingest_generation(db), "airports")
+    if not_modified(request, etag):
+        return not_modified_response(request, etag)
+
     query = union(
         select(Flight.source_code),
         select(Flight.destination_code)
@@ -139,11 +196,11 @@ async def get_airports(db: AsyncSession = Depends(get_db)):
 
     result = await db.execute(query)
     unique_airports = list(set(result.scalars().all()))
-    return unique_airports
+    return json_response(request, unique_airports, etag=etag)
 
 # Endpoint 2: Serve the flight data to populate the dashboard
 @router.get("/dashboard/data")
-async def get_dashboard_data(airport: str = None, time_range: str = 'last_24_hours', db: AsyncSession = Depends(get_db)):
+async def get_dashboard_data(request: Request, airport: str = None, time_range: str = 'last_24_hours', db: AsyncSession = Depends(get_db)):
     """
     Serve flight data to populate the dashboard based on the selected time range and airport.
     """
@@ -154,6 +211,12 @@ async def get_dashboard_data(airport: str = None, time_range: str = 'last_24_hou
         start_time = datetime.combine(now.date(), datetime.min.time())
     else:
         start_time = now - timedelta(hours=24)
+    start_time = start_time.replace(second=0, microsecond=0)
+
+    # Data only changes on ingest or when the window start moves to the next minute
+    etag = make_etag(await get_ingest_generation(db), airport, start_time.isoformat())
+    if not_modified(request, etag):
+        return not_modified_response(request, etag)
 
     # Base query for flights where scheduled departure or arrival is within the time range
     query = select(Flight).where(
@@ -187,16 +250,16 @@ async def get_dashboard_data(airport: str = None, time_range: str = 'last_24_hou
         {
             "icao": flight.icao24,
             "status": flight.status,
-            "scheduled_departure": flight.scheduled_departure.strftime('%Y-%m-%d %H:%M'),
-            "scheduled_arrival": flight.scheduled_arrival.strftime('%Y-%m-%d %H:%M'),
+            "scheduled_departure": flight.scheduled_departure.isoformat(' ', 'minutes') if flight.scheduled_departure else None,
+            "scheduled_arrival": flight.scheduled_arrival.isoformat(' ', 'minutes') if flight.scheduled_arrival else None,
             "source": flight.source_code,
             "destination": flight.destination_code
         }
         for flight in flights
     ]
 
-    # Return the data as a JSON response
-    return JSONResponse({
+    # Return the data as a (compressed, cacheable) JSON response
+    return json_response(request, {
         "total_flights": total_flights,
         "on_time": on_time_flights,
         "delayed": delayed_flights,
@@ -204,7 +267,7 @@ async def get_dashboard_data(airport: str = None, time_range: str = 'last_24_hou
         "landed": landed_flights,
         "flights": flight_details,
         "real_time_updates": [len(flights)]
-    })
+    }, etag=etag)
 
 # Route to subscribe to flight or airport updates
 @router.post("/subscribe")
@@ -214,50 +277,103 @@ async def subscribe_to_updates(client_id: str, flight_id: Optional[str] = None,
     """
     if not flight_id and not airport_code:
         raise HTTPException(status_code=400, detail="You must provide either a flight_id or an airport_code.")
-    
+
     subscription_type = 'flight' if flight_id else 'airport'
 
-    query = select(Subscription).where(
-        (Subscription.flight_id == flight_id) | (Subscription.airport_code == airport_code),
-        Subscription.client_id == client_id
-    )
-    existing_subscription = await db.execute(query)
-    existing_subscription = existing_subscription.scalar_one_or_none()
+    # Insert-or-skip on the (client_id, type, target) constraint, so concurrent calls can't create duplicates
+    results = await bulk_subscribe(db, [{"client_id": client_id, "flight_id": flight_id, "airport_code": airport_code}])
+    await db.commit()
+
+    if results[0]["status"] == "invalid":
+        raise HTTPException(status_code=400, detail=results[0]["detail"])
 
-    if existing_subscription:
+    if results[0]["status"] == "already_subscribed":
         return {"message": "You are already subscribed to this flight or airport."}
-    
-    # Create new subscription
-    new_subscription = Subscription(
-        client_id=client_id,
-        flight_id=flight_id if flight_id else None,
-        airport_code=airport_code if airport_code else None,
-        subscription_type=subscription_type
+
+    return {"message": f"Successfully subscribed to {subscription_type} updates."}
+
+# Read the items of a bulk subscription request (JSON array or NDJSON)
+async def read_bulk_items(request: Request) -> list:
+    too_large = HTTPException(
+        status_code=413,
+        detail=f"Bulk requests are limited to {MAX_BULK_ITEMS} items; split larger loads into several requests."
     )
 
-    db.add(new_subscription)
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_BULK_BODY_BYTES:
+        raise too_large
+
+    # Read the body in chunks so uploads without a Content-Length are capped too
+    body = bytearray()
+    async for chunk in request.stream():
+        body.extend(chunk)
+        if len(body) > MAX_BULK_BODY_BYTES:
+            raise too_large
+
+    try:
+        items = parse_bulk_items(bytes(body), request.headers.get("content-type"))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid bulk subscription body: {e}")
+
+    if len(items) > MAX_BULK_ITEMS:
+        raise too_large
+    return items
+
+# Route to subscribe many clients at once
+@router.post("/subscribe/bulk")
+async def bulk_subscribe_to_updates(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Subscribe many clients to flight or airport updates in one request.
+    The body is a JSON array or NDJSON of {client_id, flight_id | airport_code} objects;
+    the response reports the outcome of each item by its position.
+    At most MAX_BULK_ITEMS (50,000) items are accepted per request, otherwise 413 is returned;
+    larger loads must be split into several requests.
+    """
+    items = await read_bulk_items(request)
+    results = await bulk_subscribe(db, items)
     await db.commit()
 
-    return {"message": f"Successfully subscribed to {subscription_type} updates."}
+    return json_response(request, {"summary": summarize_results(results), "results": results})
+
+# Route to unsubscribe many clients at once
+@router.post("/unsubscribe/bulk")
+async def bulk_unsubscribe_from_updates(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Remove many flight or airport subscriptions in one request, using the same body format
+    and the same MAX_BULK_ITEMS (50,000) per-request limit as /subscribe/bulk.
+    """
+    items = await read_bulk_items(request)
+    results = await bulk_unsubscribe(db, items)
+    await db.commit()
+
+    return json_response(request, {"summary": summarize_results(results), "results": results})
 
 # Route to get data for a specific flight by icao
 @router.get("/{icao}", response_model=FlightBase)
-async def read_flight(icao: str, db: AsyncSession = Depends(get_db)):
+async def read_flight(request: Request, icao: str, db: AsyncSession = Depends(get_db)):
     """
     Fetch flight details by callsign.
     """
+    etag = make_etag(await get_ingest_generation(db), "flight", icao)
+    if not_modified(request, etag):
+        return not_modified_response(request, etag)
+
     result = await db.execute(select(Flight).where(Flight.icao24 == icao))
     flight = result.scalar_one_or_none()
     if flight is None:
         raise HTTPException(status_code=404, detail="Flight not found")
-    return flight
+    return json_response(request, flight_json(flight), etag=etag)
 
 # Route to get all flights associated with an airport (source or destination)
 @router.get("/airport/{airport_code}", response_model=dict)
-async def get_flights_by_airport(airport_code: str, db: AsyncSession = Depends(get_db)):
+async def get_flights_by_airport(request: Request, airport_code: str, db: AsyncSession = Depends(get_db)):
     """
     Fetch inbound and outbound flights for a given airport code.
     """
+    etag = make_etag(await get_ingest_generation(db), "airport", airport_code)
+    if not_modified(request, etag):
+        return not_modified_response(request, etag)
+
     inbound_result = await db.execute(
         select(Flight).where(Flight.destination_code == airport_code)
     )
@@ -268,7 +384,7 @@ async def get_flights_by_airport(airport_code: str, db: AsyncSession = Depends(g
     )
     outbound_flights = outbound_result.scalars().all()
 
-    return {
-        "inbound_flights": [FlightBase.from_orm(flight) for flight in inbound_flights],
-        "outbound_flights": [FlightBase.from_orm(flight) for flight in outbound_flights],
-    }
+    return json_response(request, {
+        "inbound_flights": [flight_json(flight) for flight in inbound_flights],
+        "outbound_flights": [flight_json(flight) for flight in outbound_flights],
+    }, etag=etag)
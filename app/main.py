@@ -1,11 +1,11 @@
-from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, HTTPException, Request
 import asyncio
-import os
+from sqlalchemy import inspect, text
 from app.models import Base
 from app.flight_data_service import process_flight_data
 from app.database import engine
 from app.flight_routes import router as flight_router
+from app.utils.responses import asset_response, get_static_asset, load_static_assets
 
 app = FastAPI(
     title="Real-Time Flight Tracking Service",
@@ -13,14 +13,42 @@ app = FastAPI(
     version="1.0.0",
 )
 
-# Serve static files (including index.html) from the /static directory
-app.mount("/static", StaticFiles(directory=os.path.join(os.path.dirname(__file__), "..", "static")), name="static")
+# Serve static files (including index.html) from the preloaded, pre-compressed /static assets
+@app.api_route("/static/{file_path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def serve_static(file_path: str, request: Request):
+    asset = get_static_asset(file_path)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return asset_response(request, asset)
+
+# Bring a subscriptions table created before the (client_id, subscription_type, target)
+# unique key up to date: add and backfill target, drop duplicate rows, add the unique index
+def migrate_subscriptions(conn):
+    columns = [column["name"] for column in inspect(conn).get_columns("subscriptions")]
+    if "target" in columns:
+        return
+
+    print("Migrating subscriptions table: adding target column and unique index")
+    conn.execute(text("ALTER TABLE subscriptions ADD COLUMN target VARCHAR(255)"))
+    conn.execute(text(
+        "UPDATE subscriptions SET target = CASE WHEN subscription_type = 'flight' "
+        "THEN flight_id ELSE airport_code END"
+    ))
+    conn.execute(text(
+        "DELETE FROM subscriptions WHERE id NOT IN ("
+        "SELECT MIN(id) FROM subscriptions GROUP BY client_id, subscription_type, target)"
+    ))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX uq_subscription_client_target "
+        "ON subscriptions (client_id, subscription_type, target)"
+    ))
 
 # Function to create database tables asynchronously
 async def create_tables():
     try:
         async with engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(migrate_subscriptions)
     except Exception as e:
         print(f"Error creating tables: {e}")
 
@@ -30,6 +58,9 @@ async def startup_event():
     # Ensure tables are created on startup
     await create_tables()
 
+    # Read and pre-compress the static assets once instead of on every request
+    load_static_assets()
+
     # Start background task to periodically fetch flight data
     asyncio.create_task(periodic_fetch())
 
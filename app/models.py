@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, Enum, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Float, Enum, Boolean, Text, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
@@ -41,9 +41,60 @@ class Flight(Base):
 
 class Subscription(Base):
     __tablename__ = "subscriptions"
+    __table_args__ = (
+        UniqueConstraint("client_id", "subscription_type", "target", name="uq_subscription_client_target"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     client_id = Column(String(255), index=True)
     flight_id = Column(String(255), nullable=True)
     airport_code = Column(String(10), nullable=True)
-    subscription_type = Column(String(10), nullable=False)
\ No newline at end of file
+    subscription_type = Column(String(10), nullable=False)
+
+    # The flight_id or airport_code being subscribed to, depending on subscription_type
+    target = Column(String(255), nullable=False)
+
+
+class CountedDelay(Base):
+    __tablename__ = "counted_delays"
+    __table_args__ = (
+        UniqueConstraint("metric", "icao", "scheduled", name="uq_counted_delay"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    # A flight's departure or arrival delay that has already been added to the delay sketches
+    metric = Column(String(20), nullable=False)
+    icao = Column(String(255), nullable=False)
+    scheduled = Column(DateTime, nullable=False, index=True)
+
+
+class DelaySketch(Base):
+    __tablename__ = "delay_sketches"
+    __table_args__ = (
+        UniqueConstraint("bucket_start", "scope", "key", "metric", name="uq_delay_sketch_bucket"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    # Hourly time bucket (UTC) the delays were scheduled in
+    bucket_start = Column(DateTime, nullable=False, index=True)
+
+    # 'airport' (key = airport code) or 'route' (key = "SOURCE-DESTINATION")
+    scope = Column(String(10), nullable=False)
+    key = Column(String(25), nullable=False, index=True)
+
+    # 'departure_delay' or 'arrival_delay'
+    metric = Column(String(20), nullable=False)
+
+    # Serialized DDSketch of the delays (in minutes) observed in this bucket
+    sketch = Column(Text, nullable=False)
+
+
+class IngestState(Base):
+    __tablename__ = "ingest_state"
+
+    # Single row (id = 1) bumped in every committed ingest; data route ETags are derived from it
+    id = Column(Integer, primary_key=True)
+    generation = Column(Integer, nullable=False, default=0)
+    last_ingest_at = Column(DateTime, nullable=True)
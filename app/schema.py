@@ -40,4 +40,10 @@ class SubscriptionBase(BaseModel):
     subscription_type: str  # Either 'flight' or 'airport'
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# Define a Pydantic model for one item of a bulk subscribe/unsubscribe request
+class SubscriptionItem(BaseModel):
+    client_id: str  # ID of the subscribing client
+    flight_id: Optional[str] = None  # Flight ID to (un)subscribe
+    airport_code: Optional[str] = None  # Airport code to (un)subscribe
@@ -0,0 +1,154 @@
+# app/subscription_service.py
+
+import json
+import logging
+from pydantic import ValidationError
+from sqlalchemy import delete, select
+from app.database import BULK_BATCH_SIZE, execute_in_batches, insert_or_skip
+from app.models import Subscription
+from app.schema import SubscriptionItem
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Largest bulk request accepted; partners with more subscriptions split them into several requests
+MAX_BULK_ITEMS = 50_000
+
+# Upper bound on a bulk request body, so oversized uploads are rejected before being buffered
+MAX_BULK_BODY_BYTES = MAX_BULK_ITEMS * 1024
+
+# Bulk statements run on the Core table and connection: the ORM bulk path would fall back to
+# one INSERT per row here, and rebuilding a multi-VALUES statement per batch is compile-bound
+subscriptions_table = Subscription.__table__
+
+# Insert-or-skip on the unique (client_id, type, target) constraint
+_insert_stmt = insert_or_skip(subscriptions_table, ["client_id", "subscription_type", "target"])
+
+
+# Build the subscription row for a client and flight/airport, or None if neither is given
+def build_subscription(client_id: str, flight_id: str = None, airport_code: str = None):
+    if not client_id or (not flight_id and not airport_code):
+        return None
+
+    subscription_type = 'flight' if flight_id else 'airport'
+    return {
+        "client_id": client_id,
+        "flight_id": flight_id if flight_id else None,
+        "airport_code": airport_code if airport_code else None,
+        "subscription_type": subscription_type,
+        "target": flight_id if flight_id else airport_code,
+    }
+
+
+# Unique key of a subscription row, matching the (client_id, type, target) constraint
+def subscription_key(row: dict) -> tuple:
+    return (row["client_id"], row["subscription_type"], row["target"])
+
+
+# Parse a bulk request body given either as a JSON array or as NDJSON (one object per line)
+def parse_bulk_items(body: bytes, content_type: str = None) -> list:
+    text = body.decode("utf-8").strip()
+    if not text:
+        return []
+
+    if "ndjson" not in (content_type or "") and text.startswith("["):
+        items = json.loads(text)
+        if not isinstance(items, list):
+            raise ValueError("Expected a JSON array of subscriptions.")
+        return items
+
+    items = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            items.append(json.loads(line))
+        except json.JSONDecodeError:
+            # Keep the position so the per-item result can report it
+            items.append(None)
+    return items
+
+
+# Validate raw items; returns (index, row) pairs to apply and the results for rejected items
+def _prepare_rows(items: list):
+    results = [None] * len(items)
+    rows = []
+    seen = set()
+
+    for index, raw in enumerate(items):
+        try:
+            item = SubscriptionItem.model_validate(raw)
+        except ValidationError:
+            results[index] = {"index": index, "status": "invalid", "detail": "Malformed subscription item."}
+            continue
+
+        row = build_subscription(item.client_id, item.flight_id, item.airport_code)
+        if row is None:
+            results[index] = {"index": index, "status": "invalid",
+                              "detail": "You must provide a client_id and either a flight_id or an airport_code."}
+            continue
+
+        key = subscription_key(row)
+        if key in seen:
+            results[index] = {"index": index, "status": "duplicate", "detail": "Repeated earlier in this request."}
+            continue
+        seen.add(key)
+        rows.append((index, row))
+
+    return rows, results
+
+
+# Insert subscriptions in batches, skipping ones that already exist; caller commits
+async def bulk_subscribe(session, items: list) -> list:
+    rows, results = _prepare_rows(items)
+    connection = await session.connection()
+
+    inserted = set(await execute_in_batches(connection, _insert_stmt, [row for _, row in rows]))
+    for index, row in rows:
+        status = "subscribed" if subscription_key(row) in inserted else "already_subscribed"
+        results[index] = {"index": index, "status": status}
+
+    logger.info(f"Bulk subscribe processed {len(items)} items")
+    return results
+
+
+# Delete subscriptions in batches, reporting which ones did not exist; caller commits
+async def bulk_unsubscribe(session, items: list) -> list:
+    rows, results = _prepare_rows(items)
+    connection = await session.connection()
+
+    for start in range(0, len(rows), BULK_BATCH_SIZE):
+        batch = rows[start:start + BULK_BATCH_SIZE]
+        keys = set(subscription_key(row) for _, row in batch)
+
+        # Look the rows up through the indexed client_id/target columns and match the exact key here;
+        # older SQLite versions full-scan the table for a (client_id, type, target) IN (...) row-value filter
+        result = await connection.execute(
+            select(subscriptions_table.c.id, subscriptions_table.c.client_id,
+                   subscriptions_table.c.subscription_type, subscriptions_table.c.target)
+            .where(subscriptions_table.c.client_id.in_(set(key[0] for key in keys)),
+                   subscriptions_table.c.target.in_(set(key[2] for key in keys)))
+        )
+        matches = {(client_id, subscription_type, target): subscription_id
+                   for subscription_id, client_id, subscription_type, target in result.all()
+                   if (client_id, subscription_type, target) in keys}
+
+        if matches:
+            await connection.execute(delete(subscriptions_table).where(subscriptions_table.c.id.in_(matches.values())))
+
+        for index, row in batch:
+            status = "unsubscribed" if subscription_key(row) in matches else "not_found"
+            results[index] = {"index": index, "status": status}
+
+    logger.info(f"Bulk unsubscribe processed {len(items)} items")
+    return results
+
+
+# Count results per status for the response summary
+def summarize_results(results: list) -> dict:
+    summary = {}
+    for result in results:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+    return summary
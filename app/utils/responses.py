@@ -0,0 +1,172 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+from fastapi import Request, Response
+
+# Optional fast encoders; fall back to the standard library when not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "static")
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 512
+
+# Preloaded static assets, keyed by their path relative to STATIC_DIR
+static_assets = {}
+
+
+# Encode content to JSON bytes, using orjson when available
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+# Build a strong ETag from the given parts
+def make_etag(*parts) -> str:
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:20]}"'
+
+
+# Pick the best content encoding the client accepts: brotli, then gzip, else identity
+def negotiate_encoding(accept_encoding: str):
+    accepted = {}
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+
+    def allowed(encoding):
+        return accepted.get(encoding, accepted.get("*", 0)) > 0
+
+    if brotli is not None and allowed("br"):
+        return "br"
+    if allowed("gzip"):
+        return "gzip"
+    return None
+
+
+# Compress a body with the given content encoding
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body)
+    return gzip.compress(body, compresslevel=6)
+
+
+# ETag of one content coding of a representation; strong validators must differ per coding
+def encoded_etag(etag: str, encoding: str = None) -> str:
+    if not encoding:
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+# ETag of the coding this request would be sent in. `available` limits the codings
+# (pre-compressed assets); None means any negotiated one.
+def _response_etag(request: Request, etag: str, available=None) -> str:
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if available is not None and encoding not in available:
+        encoding = None
+    return encoded_etag(etag, encoding)
+
+
+# Check whether the request's If-None-Match matches the ETag of the coding it would be sent in
+def not_modified(request: Request, etag: str, available=None) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or _response_etag(request, etag, available) in candidates
+
+
+# Empty 304 response carrying the ETag of the coding this request would have been sent in
+def not_modified_response(request: Request, etag: str, available=None) -> Response:
+    return Response(status_code=304, headers={"ETag": _response_etag(request, etag, available), "Vary": "Accept-Encoding"})
+
+
+# A static file held in memory together with its pre-compressed variants
+class StaticAsset:
+    def __init__(self, body: bytes, media_type: str):
+        self.body = body
+        self.media_type = media_type
+        self.etag = make_etag(hashlib.sha1(body).hexdigest())
+        self.encoded = {}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            self.encoded["gzip"] = compress(body, "gzip")
+            if brotli is not None:
+                self.encoded["br"] = compress(body, "br")
+
+
+# Read and pre-compress every file under the static directory
+def load_static_assets(directory: str = STATIC_DIR) -> dict:
+    assets = {}
+    for root, _, files in os.walk(directory):
+        for name in files:
+            file_path = os.path.join(root, name)
+            relative_path = os.path.relpath(file_path, directory).replace(os.sep, "/")
+            media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            if media_type.startswith("text/"):
+                media_type += "; charset=utf-8"
+            with open(file_path, "rb") as asset_file:
+                assets[relative_path] = StaticAsset(asset_file.read(), media_type)
+
+    static_assets.clear()
+    static_assets.update(assets)
+    return static_assets
+
+
+# Look up a preloaded asset, loading the static directory on first use
+def get_static_asset(path: str):
+    if not static_assets:
+        load_static_assets()
+    return static_assets.get(path)
+
+
+# Serve a preloaded asset, honouring If-None-Match and Accept-Encoding
+def asset_response(request: Request, asset: StaticAsset) -> Response:
+    if not_modified(request, asset.etag, asset.encoded):
+        return not_modified_response(request, asset.etag, asset.encoded)
+
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if encoding in asset.encoded:
+        headers = {"ETag": encoded_etag(asset.etag, encoding), "Vary": "Accept-Encoding", "Content-Encoding": encoding}
+        return Response(asset.encoded[encoding], media_type=asset.media_type, headers=headers)
+
+    headers = {"ETag": asset.etag, "Vary": "Accept-Encoding"}
+    return Response(asset.body, media_type=asset.media_type, headers=headers)
+
+
+# Encode content as JSON with negotiated compression. Routes with an ETag should check
+# not_modified() before doing any work; the ETag is only attached to the response here.
+# ETagged bodies are always compressed when the client accepts it, so a 304 can name the
+# coding's ETag without knowing the body size.
+def json_response(request: Request, content, etag: str = None) -> Response:
+    headers = {"Vary": "Accept-Encoding"}
+    body = dumps(content)
+
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if encoding and (etag or len(body) >= MIN_COMPRESS_SIZE):
+        body = compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+    else:
+        encoding = None
+
+    if etag:
+        headers["ETag"] = encoded_etag(etag, encoding)
+    return Response(body, media_type="application/json", headers=headers)
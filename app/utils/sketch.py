@@ -0,0 +1,110 @@
+import math
+
+
+# Mergeable quantile sketch (DDSketch) used for streaming delay percentiles.
+# Values are mapped to logarithmic buckets so that every quantile estimate is
+# within `relative_accuracy` of the true value, and two sketches with the same
+# accuracy can be merged by simply adding their bucket counts.
+class DDSketch:
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive = {}  # bucket index -> count for values > 0
+        self.negative = {}  # bucket index -> count for |values| of values < 0
+        self.zero_count = 0
+        self.count = 0
+        self.min = None
+        self.max = None
+
+    def _key(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, key: int) -> float:
+        # Midpoint of the bucket (gamma^(key-1), gamma^key] in the relative-error sense
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    # Add a single value to the sketch
+    def add(self, value: float):
+        if value is None:
+            return
+        if value > 0:
+            key = self._key(value)
+            self.positive[key] = self.positive.get(key, 0) + 1
+        elif value < 0:
+            key = self._key(-value)
+            self.negative[key] = self.negative.get(key, 0) + 1
+        else:
+            self.zero_count += 1
+
+        self.count += 1
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    # Merge another sketch into this one
+    def merge(self, other: "DDSketch"):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for key, count in other.positive.items():
+            self.positive[key] = self.positive.get(key, 0) + count
+        for key, count in other.negative.items():
+            self.negative[key] = self.negative.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        if other.max is not None:
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    # Estimate the value at quantile q (0 <= q <= 1)
+    def quantile(self, q: float):
+        if self.count == 0:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+
+        rank = q * (self.count - 1)
+        seen = 0
+
+        # Negative values, from most negative (largest key) to closest to zero
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return max(-self._value(key), self.min)
+
+        seen += self.zero_count
+        if seen > rank:
+            return 0
+
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return min(self._value(key), self.max)
+
+        return self.max
+
+    # Serialize the sketch to a JSON-friendly dict
+    def to_dict(self) -> dict:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "positive": {str(key): count for key, count in self.positive.items()},
+            "negative": {str(key): count for key, count in self.negative.items()},
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+        }
+
+    # Rebuild a sketch from its serialized form
+    @classmethod
+    def from_dict(cls, data: dict) -> "DDSketch":
+        sketch = cls(data.get("relative_accuracy", 0.01))
+        sketch.positive = {int(key): count for key, count in data.get("positive", {}).items()}
+        sketch.negative = {int(key): count for key, count in data.get("negative", {}).items()}
+        sketch.zero_count = data.get("zero_count", 0)
+        sketch.count = data.get("count", 0)
+        sketch.min = data.get("min")
+        sketch.max = data.get("max")
+        return sketch
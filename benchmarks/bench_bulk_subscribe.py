@@ -0,0 +1,66 @@
+# benchmarks/bench_bulk_subscribe.py
+#
+# Measures bulk subscribe/unsubscribe throughput against a scratch SQLite database.
+# Usage: python -m benchmarks.bench_bulk_subscribe [--count 1000000]
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from app.models import Base
+from app.subscription_service import MAX_BULK_ITEMS, bulk_subscribe, bulk_unsubscribe, parse_bulk_items, summarize_results
+
+
+# Build an NDJSON body with a mix of airport and flight subscriptions
+def build_ndjson(count: int) -> bytes:
+    lines = []
+    for i in range(count):
+        if i % 2:
+            item = {"client_id": f"client-{i // 10}", "airport_code": f"A{i % 1000:03d}"}
+        else:
+            item = {"client_id": f"client-{i // 10}", "flight_id": f"FL{i}"}
+        lines.append(json.dumps(item))
+    return "\n".join(lines).encode("utf-8")
+
+
+# Run one timed phase in MAX_BULK_ITEMS chunks, one transaction each like separate bulk requests
+async def timed(label, session_factory, operation, items):
+    results = []
+    start = time.perf_counter()
+    for chunk_start in range(0, len(items), MAX_BULK_ITEMS):
+        async with session_factory() as session:
+            results.extend(await operation(session, items[chunk_start:chunk_start + MAX_BULK_ITEMS]))
+            await session.commit()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} {len(items) / elapsed:>12,.0f} items/s  {elapsed:8.2f}s  {summarize_results(results)}")
+
+
+async def main(count: int):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(directory, 'bench.db')}")
+        session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        body = build_ndjson(count)
+        start = time.perf_counter()
+        items = parse_bulk_items(body, "application/x-ndjson")
+        print(f"{'parse ndjson':<22} {count / (time.perf_counter() - start):>12,.0f} items/s")
+
+        await timed("subscribe (new)", session_factory, bulk_subscribe, items)
+        await timed("subscribe (existing)", session_factory, bulk_subscribe, items)
+        await timed("unsubscribe", session_factory, bulk_unsubscribe, items)
+
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk subscription benchmark")
+    parser.add_argument("--count", type=int, default=1_000_000, help="Number of subscriptions")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.count))